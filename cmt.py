@@ -3,16 +3,171 @@ Simple and Reliable Facebook Comment Reply Bot
 """
 import os
 import time
+import queue
+import re
+import random
+import signal
+import asyncio
+import hashlib
 import logging
+import threading
 from datetime import datetime, timedelta
-from playwright.sync_api import sync_playwright, Page
-from openai import OpenAI
+import httpx
+try:
+    import numpy as np
+except ImportError:  # Only the optional semantic cache needs numpy
+    np = None
+from playwright.async_api import async_playwright, Page
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, RateLimitError, APIConnectionError, InternalServerError
 from database import SupabaseDatabase
 from config import get_bot_config, get_supabase_config, get_openai_config
+from constants import (
+    MAX_CACHE_SIZE, MAX_SESSION_COMMENT_IDS, SHORT_COMMENT_MAX_LEN, EMBEDDING_MODEL, EMBEDDING_DIM, SEMANTIC_CACHE_SIZE,
+    FACEBOOK_SELECTORS, REPLY_BUTTON_SELECTORS, REPLY_BOX_SELECTORS, FULL_RELOAD_EVERY_SCANS, ELEMENT_WAIT_TIMEOUT,
+    FULL_RELOAD_AFTER_EMPTY_SCANS, PENDING_WRITES_MAX,
+)
 from utils.logger import setup_logger
+from utils.rate_limiter import TokenBucket
+from utils.cache import LRUCache
 
 logger = setup_logger(__name__)
 
+
+# Scrolls down in steps inside the page: [steps, pixels per step, ms between steps]
+_SCROLL_JS = """
+([steps, size, delayMs]) => new Promise(resolve => {
+    let i = 0;
+    function step() {
+        window.scrollBy(0, size);
+        if (++i >= steps) return setTimeout(resolve, delayMs);
+        setTimeout(step, delayMs);
+    }
+    step();
+})
+"""
+
+# Reads author name and text for every comment element in a single round trip
+_COMMENT_FIELDS_JS = """
+(roots) => roots.map(root => {
+    const author = root.querySelector("span.x193iq5w[dir='auto']");
+    const text = root.querySelector("div[dir='auto']");
+    return {
+        author: author ? author.textContent : null,
+        text: text ? text.textContent : null,
+    };
+})
+"""
+
+# Marks the first visible "Reply" control under a comment with data-bot-reply
+_FIND_REPLY_BUTTON_JS = """
+(root) => {
+    root.querySelectorAll('[data-bot-reply]').forEach(el => el.removeAttribute('data-bot-reply'));
+    for (const el of root.querySelectorAll('[role="button"], span, div')) {
+        if (el.offsetParent !== null && el.textContent.trim().toLowerCase() === 'reply') {
+            el.setAttribute('data-bot-reply', '1');
+            return true;
+        }
+    }
+    return false;
+}
+"""
+
+
+_NEW_MATCH_JS = "([selector, before]) => document.querySelectorAll(selector).length > before"
+
+# Reply editor state checks against the focused element, which survives editor re-renders
+_EDITOR_FOCUSED_JS = "() => !!document.activeElement && document.activeElement.isContentEditable"
+_EDITOR_HAS_TEXT_JS = """
+(prefix) => {
+    const el = document.activeElement;
+    return !!el && (el.textContent || el.value || '').includes(prefix);
+}
+"""
+_EDITOR_CLEARED_JS = """
+(prefix) => {
+    const el = document.activeElement;
+    return !el || !(el.textContent || el.value || '').includes(prefix);
+}
+"""
+
+# Tags the reply boxes already on the page, so composers left open by earlier scans are never picked
+_MARK_OPEN_REPLY_BOXES_JS = """
+(selector) => {
+    const boxes = document.querySelectorAll(selector);
+    boxes.forEach(el => el.setAttribute('data-bot-seen', '1'));
+    return boxes.length;
+}
+"""
+
+# Marks the last (most recent) visible box for the first selector that has one, ignoring tagged boxes
+_PICK_REPLY_BOX_JS = """
+(selectors) => {
+    document.querySelectorAll('[data-bot-reply-box]').forEach(el => el.removeAttribute('data-bot-reply-box'));
+    for (const selector of selectors) {
+        const boxes = [...document.querySelectorAll(selector)].filter(el => !el.hasAttribute('data-bot-seen'));
+        if (!boxes.length) continue;
+        const box = boxes[boxes.length - 1];
+        const rect = box.getBoundingClientRect();
+        if (rect.width > 0 && rect.height > 0 && getComputedStyle(box).visibility !== 'hidden') {
+            box.setAttribute('data-bot-reply-box', '1');
+            return true;
+        }
+    }
+    return false;
+}
+"""
+
+# Selector arguments for the reply box scripts, built once instead of per reply
+_EDITABLE_SELECTOR = ', '.join(REPLY_BOX_SELECTORS)
+_REPLY_BOX_SELECTOR_LIST = list(REPLY_BOX_SELECTORS)
+
+# Punctuation and emoji, stripped when normalizing short comments for the reply cache
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before a retry: the server's Retry-After if given, else jittered exponential backoff"""
+    try:
+        return min(float(error.response.headers.get('retry-after')), 60.0)
+    except (AttributeError, TypeError, ValueError):
+        return min(2 ** attempt, 60) * random.uniform(0.5, 1.5)
+
+
+class _SemanticCache:
+    """Ring buffer of (embedding, reply) pairs searched by cosine similarity"""
+    
+    def __init__(self, threshold, size=SEMANTIC_CACHE_SIZE, dim=EMBEDDING_DIM):
+        self.threshold = threshold
+        self.size = size
+        self.matrix = np.zeros((size, dim), dtype=np.float32)
+        self.replies: list[str | None] = [None] * size
+        self.count = 0
+        self.next_slot = 0
+    
+    @staticmethod
+    def _normalize(vec):
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+    
+    def lookup(self, vec):
+        """Return the cached reply most similar to vec, if above threshold"""
+        if not self.count:
+            return None
+        sims = self.matrix[:self.count] @ self._normalize(vec)
+        best = int(sims.argmax())
+        if sims[best] > self.threshold:
+            return self.replies[best]
+        return None
+    
+    def add(self, vec, reply):
+        """Store a reply, overwriting the oldest slot once full"""
+        self.matrix[self.next_slot] = self._normalize(vec)
+        self.replies[self.next_slot] = reply
+        self.next_slot = (self.next_slot + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+
 class FacebookCommentBot:
     def __init__(self):
         """Initialize the bot"""
@@ -32,29 +187,116 @@ class FacebookCommentBot:
             supabase_url=supabase_config['URL'],
             supabase_key=supabase_config['ANON_KEY']
         )
-        self.openai_client = OpenAI(api_key=openai_config['API_KEY'])
+        # Concurrent replies multiplex over one kept-alive HTTP/2 connection
+        self.openai_client = AsyncOpenAI(
+            api_key=openai_config['API_KEY'],
+            max_retries=0,  # _call_openai owns retries so 429s also slow the shared buckets
+            http_client=DefaultAsyncHttpxClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+                timeout=httpx.Timeout(30.0, connect=5.0),
+            ),
+        )
         self.openai_config = openai_config
+        
+        # Playwright and OpenAI share one event loop, so reply generation
+        # overlaps with browser work on other comments
+        self._llm_sem = asyncio.Semaphore(int(self.config.get('LLM_CONCURRENCY', 8)))
+        self._rpm_bucket = TokenBucket(openai_config.get('RPM', 3500))
+        self._tpm_bucket = TokenBucket(openai_config.get('TPM', 90000))
+        
+        self.response_cache = LRUCache(MAX_CACHE_SIZE)
+        self.cache_stats = {'hits': 0, 'misses': 0, 'semantic_hits': 0}
+        self.semantic_cache = None
+        if openai_config.get('SEMANTIC_CACHE') and np is None:
+            logger.warning("⚠️ SEMANTIC_CACHE is on but numpy is not installed; semantic cache disabled")
+        elif openai_config.get('SEMANTIC_CACHE'):
+            self.semantic_cache = _SemanticCache(openai_config.get('SEMANTIC_CACHE_THRESHOLD', 0.92))
         self.post_url = self.config.get('POST_URL')
         self.bot_name = self.config.get('MY_NAME', 'Bot')
+        self._bot_name_norm = (self.bot_name or '').strip().lower()
+        self.max_replies_per_user = int(self.config.get('MAX_REPLIES_PER_USER', 1))
+        self.max_retries = max(1, int(self.config.get('MAX_RETRIES', 3)))  # At least one attempt, or _call_openai returns None
+        self.human_typing = self.config.get('HUMAN_TYPING', True)
+        self.model = openai_config.get('MODEL', 'gpt-4o-mini')
         
         self.page: Page | None = None
+        self._comment_locator = None  # Locators are lazy, so these are built once per page
+        self._reply_box_locator = None
+        self._send_locator = None
         self.playwright = None
         self.browser = None
         self.processed_user_ids = set()  # Track users we've replied to in this session
+        self.replied_comment_ids = LRUCache(MAX_SESSION_COMMENT_IDS)  # Bounded set of comments replied to in this session
+        self._pending_writes = {'processed': [], 'user_stats': {}}  # Reply rows and per-author reply increments awaiting a flush
+        # Replies made before the switch to blake2b IDs are stored under the old ID format,
+        # which embeds the date, so only comments seen on the day the bot starts can match one
+        self._legacy_id_day = datetime.now().strftime('%Y-%m-%d')
+        self._stopping = False
+        self._wakeup_event = asyncio.Event()  # Cuts the wait between scans short, see stop()
+        
+        # Events are written to the database in batches by a background thread
+        self._log_q: queue.Queue = queue.Queue()
+        self._log_thread = threading.Thread(target=self._log_drain, name='event-log', daemon=True)
+        self._log_thread.start()
         
         logger.info("✅ Bot initialized successfully")
-        self.db.log_event('bot_startup', 'Bot started', 'info')
+        self.log_event('bot_startup', 'Bot started', 'info')
+    
+    def log_event(self, event_type, event_data, level='info'):
+        """Queue an event for the background database writer"""
+        self._log_q.put({
+            'event_type': event_type,
+            'event_data': event_data,
+            'level': level,
+            'timestamp': datetime.now().isoformat(),
+        })
+    
+    def _log_drain(self):
+        """Flush queued events in batches of up to 50 or every 2 seconds"""
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + 2
+            while len(batch) < 50:
+                try:
+                    event = self._log_q.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                batch.append(event)
+            if batch:
+                self.db.log_events_bulk(batch)
+    
+    async def _flush_writes(self):
+        """Write the queued replies in one insert and add each author's new replies to user_stats"""
+        processed = self._pending_writes['processed']
+        reply_increments = self._pending_writes['user_stats']
+        self._pending_writes = {'processed': [], 'user_stats': {}}
+        # The Supabase client blocks, so independent requests run side by side in worker threads
+        await asyncio.gather(
+            asyncio.to_thread(self.db.add_processed_comments_bulk, processed),
+            *(asyncio.to_thread(self.db.update_user_stats, author, author, count)
+              for author, count in reply_increments.items()),
+        )
+    
+    def stop(self):
+        """Finish the current reply, then shut down instead of waiting for the next scan"""
+        self._stopping = True
+        self._wakeup_event.set()
     
-    def setup_browser(self):
+    async def setup_browser(self):
         """Start Playwright and open Facebook"""
         try:
-            self.playwright = sync_playwright().start()
+            self.playwright = await async_playwright().start()
             
             user_data_dir = os.path.join(os.getcwd(), 'facebook_user_data')
             os.makedirs(user_data_dir, exist_ok=True)
             
             logger.info("🌐 Starting browser...")
-            self.browser = self.playwright.chromium.launch_persistent_context(
+            self.browser = await self.playwright.chromium.launch_persistent_context(
                 user_data_dir,
                 headless=self.config.get('HEADLESS', False),
                 args=[
@@ -66,76 +308,89 @@ class FacebookCommentBot:
                 viewport={'width': 1280, 'height': 720},
             )
             
-            self.page = self.browser.new_page()
+            self.page = await self.browser.new_page()
+            self._comment_locator = self.page.locator(FACEBOOK_SELECTORS['comment_article'])
+            self._reply_box_locator = self.page.locator("[data-bot-reply-box='1']").first
+            self._send_locator = self.page.locator("div[aria-label='Comment'], div[aria-label='Post']").first
             logger.info("✅ Browser started")
             
         except Exception as e:
             logger.error(f"❌ Browser setup failed: {e}")
             raise
     
-    def go_to_post(self):
+    async def go_to_post(self):
         """Navigate to the Facebook post"""
         try:
             logger.info(f"📄 Loading post: {self.post_url}")
-            self.page.goto(self.post_url, wait_until='domcontentloaded', timeout=30000)
-            self.page.wait_for_load_state('networkidle', timeout=10000)
-            time.sleep(2)
+            await self.page.goto(self.post_url, wait_until='domcontentloaded', timeout=30000)
+            await self._wait_for_comments()
             logger.info("✅ Post loaded")
         except Exception as e:
             logger.error(f"❌ Failed to load post: {e}")
             raise
     
-    def get_comments(self):
+    async def _wait_for_comments(self):
+        """Wait for the first comment to render; Facebook's trackers keep networkidle from settling"""
+        if not await self._wait_for(_NEW_MATCH_JS, [FACEBOOK_SELECTORS['comment_article'], 0], ELEMENT_WAIT_TIMEOUT * 1000):
+            logger.debug("No comments rendered yet")
+    
+    async def refresh_page(self, full=False):
+        """Bring new comments into view, doing a full reload only when asked"""
+        try:
+            if full:
+                await self.page.reload(wait_until='domcontentloaded')
+                await self._wait_for_comments()
+            else:
+                # Facebook renders new comments in place; get_comments scrolls down from the top again
+                await self.page.evaluate("window.scrollTo(0, 0)")
+        except Exception as e:
+            logger.warning(f"⚠️ Page refresh failed: {e}")
+    
+    async def get_comments(self):
         """Get all visible comments from the post"""
         try:
             # Scroll to load more comments
-            for _ in range(3):
-                self.page.evaluate('window.scrollBy(0, 500)')
-                time.sleep(0.5)
+            await self.page.evaluate(_SCROLL_JS, [3, 500, 500])
             
             # Get comment elements
             comments = []
-            comment_elements = self.page.locator("//div[@role='article']").all()
+            comment_elements = self._comment_locator
+            all_fields = await comment_elements.evaluate_all(_COMMENT_FIELDS_JS)
             
-            logger.info(f"🔍 Found {len(comment_elements)} comment elements")
+            logger.info(f"🔍 Found {len(all_fields)} comment elements")
+            today = datetime.now().strftime('%Y-%m-%d')
             
-            for elem in comment_elements:
+            for index, fields in enumerate(all_fields):
                 try:
                     # Get author name
-                    author_elem = elem.locator("span.x193iq5w[dir='auto']").first
-                    if not author_elem or author_elem.count() == 0:
-                        continue
-                    
-                    author = author_elem.text_content().strip()
+                    author = (fields['author'] or '').strip()
                     if not author:
                         continue
                     
                     # Skip bot's own comments
-                    if author.lower() == self.bot_name.lower():
-                        logger.debug(f"⏭️ Skipping own comment by {author}")
+                    if author.lower() == self._bot_name_norm:
+                        logger.debug("⏭️ Skipping own comment by %s", author)
                         continue
                     
                     # Get comment text
-                    text_elem = elem.locator("div[dir='auto']").first
-                    if not text_elem or text_elem.count() == 0:
-                        continue
-                    
-                    comment_text = text_elem.text_content().strip()
+                    comment_text = (fields['text'] or '').strip()
                     if not comment_text or len(comment_text) < 2:
                         continue
                     
                     # Create unique comment ID (user + text + date)
-                    today = datetime.now().strftime('%Y-%m-%d')
-                    comment_id = f"{author}_{comment_text[:50]}_{today}"
+                    comment_id = hashlib.blake2b(f"{author}|{comment_text}|{today}".encode(), digest_size=8).hexdigest()
                     
-                    comments.append({
+                    comment_data = {
                         'id': comment_id,
                         'author': author,
                         'text': comment_text,
-                        'element': elem,
-                    })
+                        'element': comment_elements.nth(index),
+                    }
+                    if today == self._legacy_id_day:
+                        comment_data['legacy_id'] = f"{author}_{comment_text[:50]}_{today}"
+                    comments.append(comment_data)
                     
-                    logger.debug(f"✓ Found comment by {author}: {comment_text[:50]}...")
+                    logger.debug("✓ Found comment by %s: %.50s...", author, comment_text)
                     
                 except Exception as e:
                     logger.debug(f"Error processing comment: {e}")
@@ -147,41 +402,91 @@ class FacebookCommentBot:
             logger.error(f"❌ Error getting comments: {e}")
             return []
     
-    def should_reply_to_comment(self, comment_id, author):
-        """Check if we should reply to this comment"""
+    def should_reply_to_comment(self, comment_id, author, replied_ids=None, reply_counts=None):
+        """Check if we should reply to this comment
+        
+        replied_ids and reply_counts, when given, are the results of bulk
+        lookups for this scan and replace the per-comment database checks.
+        """
+        # Comments replied to in this session are skipped without a DB round trip
+        if comment_id in self.replied_comment_ids:
+            return False
+        
         # Check if already replied to in database
-        if self.db.has_replied_to_comment(comment_id):
-            logger.debug(f"⏭️ Already replied to comment by {author}")
+        if replied_ids is not None:
+            already_replied = comment_id in replied_ids
+        else:
+            already_replied = self.db.has_replied_to_comment(comment_id)
+        if already_replied:
+            logger.debug("⏭️ Already replied to comment by %s", author)
             return False
         
         # Check if we've replied to this user today
-        user_reply_count = self.db.get_user_reply_count(author)
-        max_per_user = int(self.config.get('MAX_REPLIES_PER_USER', 1))
-        if user_reply_count >= max_per_user:
+        if reply_counts is not None:
+            user_reply_count = reply_counts.get(author, 0)
+        else:
+            user_reply_count = self.db.get_user_reply_count(author)
+        if user_reply_count >= self.max_replies_per_user:
             logger.info(f"⏭️ Already replied to {author} {user_reply_count} time(s) today")
             return False
         
         return True
     
-    def generate_reply(self, comment_text):
-        """Generate a reply using OpenAI"""
+    async def generate_reply(self, comment_text):
+        """Generate a reply using OpenAI, bounded by the LLM semaphore"""
         try:
-            logger.debug(f"🤖 Generating reply for: {comment_text[:50]}...")
+            logger.debug("🤖 Generating reply for: %.50s...", comment_text)
             
             system_prompt = "You are helpful assistant. Generate a brief, friendly reply to a Facebook comment. Keep it under 100 words. No emojis."
             user_prompt = f"Reply to this comment: {comment_text}"
-            
-            response = self.openai_client.chat.completions.create(
-                model=self.openai_config.get('MODEL', 'gpt-4o-mini'),
+            model = self.model
+            
+            # Short comments ("Nice post!", "price?") share one reply regardless of case and punctuation
+            cache_text = user_prompt
+            if len(comment_text) < SHORT_COMMENT_MAX_LEN:
+                cache_text = ' '.join(_PUNCT_RE.sub('', comment_text.lower()).split()) or comment_text
+            cache_key = hashlib.blake2b(f"{model}|{system_prompt}|{cache_text}".encode(), digest_size=16).digest()
+            if cache_key in self.response_cache:
+                self.cache_stats['hits'] += 1
+                logger.debug("♻️ Using cached reply")
+                return self.response_cache[cache_key]
+            self.cache_stats['misses'] += 1
+            
+            embedding = None
+            if self.semantic_cache is not None:
+                try:
+                    embedding = await self._embed(comment_text)
+                    cached = self.semantic_cache.lookup(embedding) if embedding is not None else None
+                except Exception as e:
+                    logger.debug(f"Semantic cache lookup failed: {e}")
+                    embedding = cached = None
+                if cached:
+                    self.cache_stats['semantic_hits'] += 1
+                    self.response_cache[cache_key] = cached
+                    logger.debug("♻️ Using reply from a similar comment")
+                    return cached
+            
+            max_tokens = 100
+            est_tokens = (len(system_prompt) + len(user_prompt)) // 4 + max_tokens
+            response = await self._call_openai(
+                est_tokens,
+                self.openai_client.chat.completions.create,
+                model=model,
                 messages=[
                     {'role': 'system', 'content': system_prompt},
                     {'role': 'user', 'content': user_prompt}
                 ],
                 temperature=0.7,
-                max_tokens=100
+                max_tokens=max_tokens
             )
             
             reply = response.choices[0].message.content.strip()
+            self.response_cache[cache_key] = reply
+            if embedding is not None:
+                try:
+                    self.semantic_cache.add(embedding, reply)
+                except Exception as e:
+                    logger.debug(f"Semantic cache insert failed: {e}")
             logger.info(f"✅ Generated reply: {reply[:50]}...")
             return reply
             
@@ -189,7 +494,93 @@ class FacebookCommentBot:
             logger.error(f"❌ Failed to generate reply: {e}")
             return "Thanks for your comment!"
     
-    def reply_to_comment(self, comment_data):
+    async def _call_openai(self, est_tokens, create, **kwargs):
+        """Call an OpenAI endpoint under the shared concurrency and rate limits"""
+        max_retries = self.max_retries
+        for attempt in range(max_retries):
+            await self._rpm_bucket.take(1)
+            await self._tpm_bucket.take(est_tokens)
+            try:
+                async with self._llm_sem:
+                    return await create(**kwargs)
+            except RateLimitError as e:
+                if attempt == max_retries - 1:
+                    raise
+                # Back off every caller at once instead of each retrying on its own
+                self._rpm_bucket.penalize()
+                self._tpm_bucket.penalize()
+                await asyncio.sleep(_retry_delay(e, attempt))
+            except (APIConnectionError, InternalServerError) as e:
+                if attempt == max_retries - 1:
+                    raise
+                await asyncio.sleep(_retry_delay(e, attempt))
+    
+    async def _embed(self, comment_text):
+        """Embed normalized comment text for the semantic cache"""
+        try:
+            text = ' '.join(comment_text.lower().split())
+            response = await self._call_openai(
+                len(text) // 4 + 1,
+                self.openai_client.embeddings.create,
+                model=EMBEDDING_MODEL,
+                input=text
+            )
+            return response.data[0].embedding
+        except Exception as e:
+            logger.debug(f"Embedding failed, skipping semantic cache: {e}")
+            return None
+    
+    def start_replies(self, comments):
+        """Start generating replies for a batch of comments, keyed by comment ID
+        
+        Each task runs in the background while earlier comments are being
+        typed, and is awaited only when its own reply box is ready.
+        """
+        return {c['id']: asyncio.create_task(self.generate_reply(c['text'])) for c in comments}
+    
+    async def human_type(self, text):
+        """Type text into the focused element in short bursts"""
+        if not self.human_typing:
+            await self.page.keyboard.insert_text(text)
+            return
+        
+        pos = 0
+        while pos < len(text):
+            chunk_len = random.randint(3, 7)
+            await self.page.keyboard.insert_text(text[pos:pos + chunk_len])
+            pos += chunk_len
+            await asyncio.sleep(random.uniform(0.1, 0.25))
+    
+    async def _wait_for(self, predicate_js, arg, timeout_ms):
+        """Wait until an in-page predicate is truthy; returns False on timeout"""
+        try:
+            await self.page.wait_for_function(predicate_js, arg=arg, timeout=timeout_ms, polling=100)
+            return True
+        except Exception:
+            return False
+    
+    async def find_reply_button(self, elem):
+        """Find the Reply button inside a comment element"""
+        # One in-page walk marks the button, instead of a round trip per selector
+        try:
+            if await elem.evaluate(_FIND_REPLY_BUTTON_JS):
+                logger.debug("Found Reply button via in-page scan")
+                return elem.locator("[data-bot-reply='1']").first
+        except Exception as e:
+            logger.debug(f"In-page Reply button scan failed: {e}")
+        
+        for selector in REPLY_BUTTON_SELECTORS:
+            try:
+                btn = elem.locator(selector).first
+                if btn and await btn.count() > 0:
+                    logger.debug(f"Found Reply button with selector: {selector}")
+                    return btn
+            except:
+                continue
+        
+        return None
+    
+    async def reply_to_comment(self, comment_data):
         """Reply to a specific comment"""
         author = comment_data['author']
         comment_text = comment_data['text']
@@ -202,217 +593,307 @@ class FacebookCommentBot:
             logger.info(f"Comment: {comment_text[:60]}...")
             logger.info(f"{'='*60}")
             
-            elem.scroll_into_view_if_needed()
-            time.sleep(1)
-            
-            # Try multiple selectors for Reply button
-            reply_btn = None
-            selectors = [
-                "//span[contains(text(), 'Reply')]/..",
-                "//div[@role='button' and contains(., 'Reply')]",
-                "//span[text()='Reply']",
-                "//div[contains(@class, 'x1i10hfl') and contains(., 'Reply')]",
-            ]
-            
-            for selector in selectors:
-                try:
-                    btn = elem.locator(selector).first
-                    if btn and btn.count() > 0:
-                        reply_btn = btn
-                        logger.debug(f"Found Reply button with selector: {selector}")
-                        break
-                except:
-                    continue
+            await elem.scroll_into_view_if_needed()
+            await asyncio.sleep(1)
             
+            reply_btn = await self.find_reply_button(elem)
             if not reply_btn:
                 # Try hovering over comment to reveal actions
-                elem.hover()
-                time.sleep(1)
-                for selector in selectors:
-                    try:
-                        btn = elem.locator(selector).first
-                        if btn and btn.count() > 0:
-                            reply_btn = btn
-                            logger.debug(f"Found Reply button (after hover) with selector: {selector}")
-                            break
-                    except:
-                        continue
+                await elem.hover()
+                handle = await elem.element_handle()
+                try:
+                    found = await self._wait_for(_FIND_REPLY_BUTTON_JS, handle, 1000)
+                finally:
+                    await handle.dispose()
+                if found:
+                    reply_btn = elem.locator("[data-bot-reply='1']").first
+                else:
+                    reply_btn = await self.find_reply_button(elem)
             
             if not reply_btn:
                 logger.warning(f"⚠️ No Reply button found for {author}")
                 return False
             
+            boxes_before = await self.page.evaluate(_MARK_OPEN_REPLY_BOXES_JS, _EDITABLE_SELECTOR)
+            
             logger.debug("Clicking Reply button...")
-            reply_btn.click(timeout=5000)
-            time.sleep(2)
+            await reply_btn.click(timeout=5000)
+            
+            # Continue as soon as a new reply box renders, waiting at most the old fixed pause
+            if not await self._wait_for(_NEW_MATCH_JS, [_EDITABLE_SELECTOR, boxes_before], 2000):
+                logger.debug("No new reply box appeared")
             
             # Find reply text box with multiple fallback selectors
             reply_box = None
-            box_selectors = [
-                "p[dir='auto'][contenteditable='true']",
-                "div[role='textbox'][contenteditable='true']",
-                "div[contenteditable='true'][data-testid]",
-                "div[contenteditable='true']",
-            ]
-            
-            for selector in box_selectors:
-                try:
-                    boxes = self.page.locator(selector).all()
-                    if boxes:
-                        # Take the last one (most recent/active)
-                        reply_box = boxes[-1]
-                        if reply_box.is_visible():
-                            logger.debug(f"Found reply box with selector: {selector}")
-                            break
-                except:
-                    continue
+            try:
+                if await self.page.evaluate(_PICK_REPLY_BOX_JS, _REPLY_BOX_SELECTOR_LIST):
+                    reply_box = self._reply_box_locator
+                    logger.debug("Found reply box")
+            except Exception as e:
+                logger.debug(f"Reply box lookup failed: {e}")
             
             if not reply_box:
                 logger.warning("⚠️ Reply box not found")
                 return False
             
             logger.debug("Typing reply...")
-            reply_text = self.generate_reply(comment_text)
-            reply_box.click()
-            time.sleep(0.5)
-            reply_box.type(reply_text, delay=30)
-            time.sleep(1)
+            reply_task = comment_data.get('reply_task')
+            reply_text = await reply_task if reply_task else await self.generate_reply(comment_text)
+            await reply_box.click()
+            await self._wait_for(_EDITOR_FOCUSED_JS, None, 500)
+            await self.human_type(reply_text)
+            typed_prefix = reply_text.strip()[:20]
+            if not await self._wait_for(_EDITOR_HAS_TEXT_JS, typed_prefix, 1000):
+                logger.debug("Typed text not confirmed in reply box")
             
             # Find and click Send button with multiple strategies
             sent = False
             
             # Strategy 1: Try aria-label
-            send_btn = self.page.locator("//div[@aria-label='Comment' or @aria-label='Post']").first
-            if send_btn and send_btn.count() > 0:
+            send_btn = self._send_locator
+            if send_btn and await send_btn.count() > 0:
                 logger.debug("Clicking Send button (aria-label)...")
-                send_btn.click(timeout=5000)
+                await send_btn.click(timeout=5000)
                 sent = True
-                time.sleep(2)
+                await self._wait_for(_EDITOR_CLEARED_JS, typed_prefix, 2000)
             
             # Strategy 2: Try keyboard shortcut
             if not sent:
                 logger.debug("Trying Ctrl+Enter to send...")
-                reply_box.press('Control+Enter')
-                time.sleep(2)
+                await reply_box.press('Control+Enter')
+                await self._wait_for(_EDITOR_CLEARED_JS, typed_prefix, 2000)
                 sent = True
             
             # Strategy 3: Try just Enter
             if not sent:
                 logger.debug("Trying Enter to send...")
-                reply_box.press('Enter')
-                time.sleep(2)
+                await reply_box.press('Enter')
+                await self._wait_for(_EDITOR_CLEARED_JS, typed_prefix, 2000)
                 sent = True
             
-            # Record in database
-            self.db.add_processed_comment(
-                comment_id,
-                author,
-                author,
-                comment_text[:1000],
-                reply_text[:1000],
-                status='success'
-            )
-            self.db.update_user_stats(author, author)
+            # Queue the database record; the scan loop flushes it with the others
+            self._pending_writes['processed'].append({
+                'comment_id': comment_id,
+                'user_id': author,
+                'user_name': author,
+                'comment_text': comment_text,
+                'response_text': reply_text,
+                'status': 'success',
+                'retry_count': 0,
+                'timestamp': datetime.now().isoformat(),
+            })
+            self.replied_comment_ids[comment_id] = True
+            self.processed_user_ids.add(author)
             
             logger.info(f"✅ Successfully replied to {author}")
-            self.db.log_event('reply_success', f"Replied to {author}", 'info')
+            self.log_event('reply_success', f"Replied to {author}", 'info')
             
             return True
             
         except Exception as e:
             logger.error(f"❌ Failed to reply to {author}: {e}")
-            self.db.log_event('reply_failed', f"Failed to reply to {author}: {e}", 'error')
+            self.log_event('reply_failed', f"Failed to reply to {author}: {e}", 'error')
             return False
     
-    def run_continuously(self):
+    async def run_continuously(self):
         """Run the bot continuously"""
-        scan_interval = int(self.config.get('SCAN_INTERVAL', 30))
+        scan_interval = self.config['DELAYS']['SCAN_INTERVAL']
+        max_scan_interval = max(scan_interval, self.config['DELAYS']['SCAN_INTERVAL_MAX'])
+        scan_sleep = scan_interval
         max_replies = int(self.config.get('MAX_REPLIES', 100))
         replies_made = 0
+        scan_count = 0
+        empty_scans = 0
+        
+        # The first SIGINT/SIGTERM ends the scan wait at once instead of cancelling mid-reply;
+        # a second cancels the bot wherever it is waiting, and a third gets the default action
+        loop = asyncio.get_running_loop()
+        main_task = asyncio.current_task()
+        signals = (signal.SIGINT, signal.SIGTERM)
+        
+        def on_signal():
+            if not self._stopping:
+                self.stop()
+                return
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+            main_task.cancel()
+        
+        for sig in signals:
+            try:
+                loop.add_signal_handler(sig, on_signal)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not supported on Windows event loops
         
         try:
-            self.setup_browser()
-            self.go_to_post()
+            await self.setup_browser()
+            await self.go_to_post()
             
             logger.info(f"\n{'='*60}")
             logger.info(f"🤖 FACEBOOK COMMENT BOT STARTED")
-            logger.info(f"Checking every {scan_interval} seconds")
+            logger.info(f"Checking every {scan_interval:.0f}-{max_scan_interval:.0f} seconds")
             logger.info(f"Post URL: {self.post_url}")
             logger.info(f"{'='*60}\n")
             
-            while replies_made < max_replies:
+            while replies_made < max_replies and not self._stopping:
                 try:
-                    logger.info(f"\n⏰ Checking for new comments... (Scan #{self.processed_user_ids.__len__() + 1})")
+                    scan_count += 1
+                    logger.info(f"\n⏰ Checking for new comments... (Scan #{scan_count})")
                     
                     # Get comments
-                    comments = self.get_comments()
+                    comments = await self.get_comments()
+                    pending = []
                     
                     if not comments:
                         logger.info("📭 No new comments found")
                     else:
                         logger.info(f"📬 Found {len(comments)} comment(s)")
                         
-                        # Process each comment
+                        # Nested articles can yield the same comment twice; keep the first
+                        unique_comments = {}
                         for comment_data in comments:
+                            unique_comments.setdefault(comment_data['id'], comment_data)
+                        new_ids = unique_comments.keys() - self.replied_comment_ids.keys()
+                        
+                        legacy_ids = {unique_comments[i]['legacy_id']: i for i in new_ids if 'legacy_id' in unique_comments[i]}
+                        # Legacy IDs go in their own query so one that trips the filter syntax can't fail the others
+                        replied_ids, replied_legacy_ids, reply_counts = await asyncio.gather(
+                            asyncio.to_thread(self.db.get_replied_comment_ids, list(new_ids)),
+                            asyncio.to_thread(self.db.get_replied_comment_ids, list(legacy_ids)),
+                            asyncio.to_thread(self.db.get_user_reply_counts, list({unique_comments[i]['author'] for i in new_ids})),
+                        )
+                        replied_ids |= {legacy_ids[legacy_id] for legacy_id in replied_legacy_ids}
+                        # Count each pending comment against its author's cap, so no reply is
+                        # generated for a comment the per-user limit would skip later
+                        planned_counts = dict(reply_counts)
+                        for comment_id, comment_data in unique_comments.items():
                             author = comment_data['author']
-                            comment_id = comment_data['id']
-                            
-                            if self.should_reply_to_comment(comment_id, author):
-                                if self.reply_to_comment(comment_data):
-                                    replies_made += 1
-                                    time.sleep(2)
+                            if comment_id in new_ids and self.should_reply_to_comment(comment_id, author, replied_ids, planned_counts):
+                                pending.append(comment_data)
+                                planned_counts[author] = planned_counts.get(author, 0) + 1
                             else:
-                                logger.debug(f"⏭️ Skipping comment by {author}")
+                                logger.debug("⏭️ Skipping comment by %s", comment_data['author'])
+                        pending = pending[:max_replies - replies_made]
+                        
+                        # Generate this scan's replies in the background while replying in order;
+                        # the page has a single focused editor, so replies themselves stay sequential
+                        replies = self.start_replies(pending)
+                        
+                        # Process each comment
+                        replied_authors = set()
+                        try:
+                            for comment_data in pending:
+                                author = comment_data['author']
+                                comment_id = comment_data['id']
+                                
+                                # Re-check users we already replied to during this scan
+                                if author in replied_authors and not self.should_reply_to_comment(comment_id, author, replied_ids, reply_counts):
+                                    logger.debug("⏭️ Skipping comment by %s", author)
+                                    continue
+                                
+                                comment_data['reply_task'] = replies.get(comment_id)
+                                if await self.reply_to_comment(comment_data):
+                                    replies_made += 1
+                                    replied_authors.add(author)
+                                    reply_counts[author] = reply_counts.get(author, 0) + 1
+                                    user_stats = self._pending_writes['user_stats']
+                                    user_stats[author] = user_stats.get(author, 0) + 1
+                                    # Buffer at most a few replies so a crash loses little; the rest go out in the finally below
+                                    if len(self._pending_writes['processed']) >= PENDING_WRITES_MAX:
+                                        await asyncio.gather(self._flush_writes(), asyncio.sleep(2))
+                                    else:
+                                        await asyncio.sleep(2)
+                                
+                                if replies_made >= max_replies or self._stopping:
+                                    break
+                        finally:
+                            # Drop generations for comments that were skipped
+                            for task in replies.values():
+                                task.cancel()
                             
-                            if replies_made >= max_replies:
-                                break
+                            await self._flush_writes()
                     
                     # Print stats
                     logger.info(f"\n📊 Stats: {replies_made}/{max_replies} replies made")
-                    logger.info(f"⏳ Waiting {scan_interval} seconds before next scan...")
+                    logger.debug("Reply cache: %(hits)d hits, %(semantic_hits)d semantic hits, %(misses)d misses", self.cache_stats)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        replied_cache = self.db.get_cache_stats()['replied']
+                        logger.debug("Replied-ID cache: %d hits, %d misses (%.0f%% hit rate)",
+                                     replied_cache['hits'], replied_cache['misses'], replied_cache['hit_rate'] * 100)
                     
-                    # Wait before next scan
-                    time.sleep(scan_interval)
+                    # Back off on quiet posts, return to the base interval once there is work
+                    if pending:
+                        scan_sleep = scan_interval
+                        empty_scans = 0
+                    else:
+                        scan_sleep = min(scan_sleep * 2, max_scan_interval)
+                        empty_scans += 1
+                    logger.info(f"⏳ Waiting {scan_sleep:.0f} seconds before next scan...")
                     
-                    # Reload page
-                    self.page.reload(wait_until='domcontentloaded')
-                    time.sleep(2)
+                    # Wait before next scan, with jitter so scans don't land on a fixed beat
+                    try:
+                        await asyncio.wait_for(self._wakeup_event.wait(), timeout=scan_sleep + random.uniform(0, scan_sleep * 0.1))
+                    except asyncio.TimeoutError:
+                        pass
+                    if self._stopping:
+                        logger.info("\n⛔ Bot stopped by signal")
+                        break
+                    
+                    # Reload page periodically, or when quiet scans suggest it has gone stale
+                    full_reload = scan_count % FULL_RELOAD_EVERY_SCANS == 0 or empty_scans >= FULL_RELOAD_AFTER_EMPTY_SCANS
+                    if full_reload:
+                        empty_scans = 0
+                    await self.refresh_page(full=full_reload)
                     
-                except KeyboardInterrupt:
+                except (KeyboardInterrupt, asyncio.CancelledError):
                     logger.info("\n⛔ Bot stopped by user")
                     break
                 except Exception as e:
                     logger.error(f"⚠️ Error in main loop: {e}")
-                    time.sleep(5)
+                    await asyncio.sleep(5)
+                    await self.refresh_page(full=True)
             
             logger.info(f"\n✅ Completed! Made {replies_made} replies")
             
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, asyncio.CancelledError):
             logger.info("\n⛔ Bot stopped")
         except Exception as e:
             logger.error(f"❌ Fatal error: {e}")
         finally:
-            self.cleanup()
+            await self.cleanup()
     
-    def cleanup(self):
+    async def cleanup(self):
         """Clean up resources"""
         try:
             if self.browser:
-                self.browser.close()
+                await self.browser.close()
             if self.playwright:
-                self.playwright.stop()
+                await self.playwright.stop()
             logger.info("✅ Browser closed")
         except Exception as e:
             logger.error(f"Error during cleanup: {e}")
         
-        self.db.log_event('bot_shutdown', 'Bot stopped', 'info')
+        try:
+            await self.openai_client.close()
+        except Exception as e:
+            logger.debug(f"Error closing OpenAI client: {e}")
+        
+        # Save replies from a scan that was interrupted before its flush
+        await self._flush_writes()
+        
+        self.log_event('bot_shutdown', 'Bot stopped', 'info')
+        self._log_q.put(None)
+        self._log_thread.join(timeout=10)
+        self.db.close()
         logger.info("👋 Bot shutdown complete")
 
 
 def main():
     try:
         bot = FacebookCommentBot()
-        bot.run_continuously()
+        asyncio.run(bot.run_continuously())
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
         logger.critical(f"Bot failed to start: {e}")
         raise
@@ -19,6 +19,7 @@ class DelaysConfig(TypedDict):
     LONG_MAX: float
     RELOAD_PAUSE: float
     SCAN_INTERVAL: float
+    SCAN_INTERVAL_MAX: float
 
 
 class BotConfig(TypedDict):
@@ -36,7 +37,9 @@ class BotConfig(TypedDict):
     MAX_REPLIES_PER_WINDOW: int
     REPLY_TO_THREADS: bool
     HEADLESS: bool
+    HUMAN_TYPING: bool
     RUN_CONTINUOUSLY: bool
+    LLM_CONCURRENCY: int
 
 
 class SupabaseConfig(TypedDict):
@@ -52,6 +55,10 @@ class OpenAIConfig(TypedDict):
     PROMPT: str
     TEMPERATURE: float
     MAX_TOKENS: int
+    RPM: int
+    TPM: int
+    SEMANTIC_CACHE: bool
+    SEMANTIC_CACHE_THRESHOLD: float
 
 
 def get_bot_config() -> BotConfig:
@@ -70,6 +77,7 @@ def get_bot_config() -> BotConfig:
             'LONG_MAX': float(os.getenv('DELAY_LONG_MAX', '20.0')),
             'RELOAD_PAUSE': float(os.getenv('RELOAD_PAUSE', '180.0')),
             'SCAN_INTERVAL': float(os.getenv('SCAN_INTERVAL', '15.0')),
+            'SCAN_INTERVAL_MAX': float(os.getenv('SCAN_INTERVAL_MAX', '120.0')),
         },
         'CHROME_PROFILE': os.getenv('CHROME_PROFILE', 'Default'),
         'MAX_RETRIES': int(os.getenv('MAX_RETRIES', '3')),
@@ -79,7 +87,9 @@ def get_bot_config() -> BotConfig:
         'MAX_REPLIES_PER_WINDOW': int(os.getenv('MAX_REPLIES_PER_WINDOW', '999')),
         'REPLY_TO_THREADS': os.getenv('REPLY_TO_THREADS', 'true').lower() == 'true',
         'HEADLESS': os.getenv('HEADLESS', 'false').lower() == 'true',
+        'HUMAN_TYPING': os.getenv('HUMAN_TYPING', 'true').lower() == 'true',
         'RUN_CONTINUOUSLY': os.getenv('RUN_CONTINUOUSLY', 'true').lower() == 'true',
+        'LLM_CONCURRENCY': int(os.getenv('LLM_CONCURRENCY', '8')),
     }
 
 
@@ -110,5 +120,9 @@ def get_openai_config() -> OpenAIConfig:
                   ' Do not include emojis or any introductory phrases or additional text.',
         'TEMPERATURE': float(os.getenv('OPENAI_TEMPERATURE', '0.8')),
         'MAX_TOKENS': int(os.getenv('OPENAI_MAX_TOKENS', '150')),
+        'RPM': int(os.getenv('OPENAI_RPM', '3500')),
+        'TPM': int(os.getenv('OPENAI_TPM', '90000')),
+        'SEMANTIC_CACHE': os.getenv('SEMANTIC_CACHE', 'false').lower() == 'true',
+        'SEMANTIC_CACHE_THRESHOLD': float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92')),
     }
 
@@ -38,7 +38,7 @@ CHROME_LAUNCH_ARGS: Final[list[str]] = [
 # Facebook selectors (updated for current Facebook structure)
 FACEBOOK_SELECTORS: Final[dict[str, str]] = {
     'main_content': "//div[@role='main']",
-    'comment_article': "//div[@role='article']",
+    'comment_article': "div[role='article']",
     'comment_text': 'div[dir="auto"]',
     'author_name': 'span.x193iq5w[dir="auto"]',
     'reply_button': "//div[@role='button' and contains(text(), 'Reply')]",
@@ -46,9 +46,41 @@ FACEBOOK_SELECTORS: Final[dict[str, str]] = {
     'submit_button': "//div[@role='button' and @aria-label='Comment']",
 }
 
+# Reply button fallbacks, tried in order when the in-page scan finds nothing
+REPLY_BUTTON_SELECTORS: Final[tuple[str, ...]] = (
+    "//span[contains(text(), 'Reply')]/..",
+    "//div[@role='button' and contains(., 'Reply')]",
+    "//span[text()='Reply']",
+    "//div[contains(@class, 'x1i10hfl') and contains(., 'Reply')]",
+)
+
+# Reply text box selectors, most specific first
+REPLY_BOX_SELECTORS: Final[tuple[str, ...]] = (
+    "p[dir='auto'][contenteditable='true']",
+    "div[role='textbox'][contenteditable='true']",
+    "div[contenteditable='true'][data-testid]",
+    "div[contenteditable='true']",
+)
+
 # Cache limits
 MAX_CACHE_SIZE: Final[int] = 100
 CACHE_CLEANUP_SIZE: Final[int] = 20
+MAX_SESSION_COMMENT_IDS: Final[int] = 10_000
+DB_ID_CACHE_SIZE: Final[int] = 50_000  # Comment IDs known to be processed/replied, per database client
+REPLIED_PREFETCH_LIMIT: Final[int] = 5000  # Recent replied comment IDs loaded into that cache at startup
+SHORT_COMMENT_MAX_LEN: Final[int] = 80  # Shorter comments share cached replies by normalized text
+PENDING_WRITES_MAX: Final[int] = 5  # Posted replies buffered before the scan loop writes them to the database
+
+# Semantic reply cache (embedding lookup for near-duplicate comments)
+EMBEDDING_MODEL: Final[str] = 'text-embedding-3-small'
+EMBEDDING_DIM: Final[int] = 1536
+SEMANTIC_CACHE_SIZE: Final[int] = 512
+
+# Scan loop: new comments usually render live, so a full page reload is periodic recovery.
+# Facebook doesn't reliably push new top-level comments into an open post, so a run of
+# empty scans also reloads rather than waiting out the periodic one at the backed-off interval
+FULL_RELOAD_EVERY_SCANS: Final[int] = 10
+FULL_RELOAD_AFTER_EMPTY_SCANS: Final[int] = 3
 
 # Retry configuration
 DEFAULT_MAX_RETRIES: Final[int] = 3
@@ -1,7 +1,11 @@
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterator
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
+from constants import DB_ID_CACHE_SIZE, REPLIED_PREFETCH_LIMIT
+from utils.cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +13,17 @@ class SupabaseDatabase:
     def __init__(self, supabase_url: str, supabase_key: str):
         try:
             self.client: Client = create_client(supabase_url, supabase_key)
+            # A comment never becomes unprocessed, so positive lookups are cached for good
+            self._processed_ids = LRUCache(DB_ID_CACHE_SIZE)
+            self._replied_ids = LRUCache(DB_ID_CACHE_SIZE)
+            self._cache_counts = {'processed_hits': 0, 'processed_misses': 0, 'replied_hits': 0, 'replied_misses': 0}
+            self._counts_lock = threading.Lock()  # Lookups run in worker threads, so counts are bumped under a lock
+            self._has_bump_rpc = True  # Cleared if the bump_user_stats function is not installed
+            self._has_stats_rpc = True  # Cleared if the get_bot_statistics function is not installed
+            # Rate limit rows are inserted in batches within a second; readers flush first so counts stay exact
+            self._rate_limit_buffer: list[Dict[str, str]] = []
+            self._rate_limit_timer: Optional[threading.Timer] = None
+            self._buffer_lock = threading.Lock()
             logger.info("✓ Supabase client initialized successfully")
             self._init_tables()
         except Exception as e:
@@ -17,18 +32,42 @@ class SupabaseDatabase:
 
     def _init_tables(self):
         try:
-            result = self.client.table('processed_comments').select('count').limit(1).execute()
+            result = self.client.table('processed_comments').select('id', count='exact', head=True).execute()
             logger.info(f"✓ Database tables verified - {result.count if result else 0} processed comments found")
+            self._prefetch_replied_ids()
         except Exception as e:
             logger.warning(f"⚠️ Could not verify tables. Please create them via Supabase SQL Editor. Error: {e}")
             logger.info("Run the SQL schema from SUPABASE_SCHEMA.sql to create tables")
 
+    def _prefetch_replied_ids(self):
+        """Warm the replied-ID cache with recent replies so restarts don't re-query them one by one."""
+        # Oldest first, so the newest IDs are the last to be evicted
+        for comment_id in reversed(self.get_all_replied_comment_ids(limit=REPLIED_PREFETCH_LIMIT)):
+            self._remember(comment_id, 'success')
+        logger.debug("✓ Prefetched %s replied comment IDs", len(self._replied_ids))
+
+    def _remember(self, comment_id: str, status: str):
+        self._processed_ids[comment_id] = True
+        if status == 'success':
+            self._replied_ids[comment_id] = True
+
+    def _count(self, name: str, n: int = 1):
+        with self._counts_lock:
+            self._cache_counts[name] += n
+
     def is_comment_processed(self, comment_id: str) -> bool:
+        if comment_id in self._processed_ids:
+            self._count('processed_hits')
+            return True
+        self._count('processed_misses')
         try:
-            result = self.client.table('processed_comments').select('id').eq('comment_id', comment_id).execute()
-            return len(result.data) > 0 if result.data else False
+            result = self.client.table('processed_comments').select('id').eq('comment_id', comment_id).limit(1).execute()
+            if result.data:
+                self._processed_ids[comment_id] = True
+                return True
+            return False
         except Exception as e:
-            logger.debug(f"Database offline, allowing comment {comment_id[:8]} to be processed: {e}")
+            logger.debug("Database offline, allowing comment %.8s to be processed: %s", comment_id, e)
             return False
 
     def add_processed_comment(self, comment_id: str, user_id: str, user_name: str, comment_text: str, response_text: str, status: str = 'success', retry_count: int = 0):
@@ -44,44 +83,88 @@ class SupabaseDatabase:
                 'timestamp': datetime.now().isoformat()
             }
             result = self.client.table('processed_comments').insert(data).execute()
+            self._remember(comment_id, status)
             logger.info(f"✓ Logged processed comment: {comment_id} by {user_name}")
             return result
         except Exception as e:
             logger.warning(f"⚠️  Could not log processed comment (offline mode): {e}")
             return None
 
+    def add_processed_comments_bulk(self, rows: list[Dict[str, str | int]]):
+        """Insert several processed_comments rows in a single request."""
+        if not rows:
+            return
+        try:
+            data = [{**row, 'comment_text': row['comment_text'][:1000], 'response_text': row['response_text'][:1000]} for row in rows]
+            self.client.table('processed_comments').insert(data).execute()
+            for row in rows:
+                self._remember(row['comment_id'], row['status'])
+            logger.info(f"✓ Logged {len(rows)} processed comments")
+        except Exception as e:
+            logger.warning(f"⚠️  Could not log {len(rows)} processed comments (offline mode): {e}")
+
     def get_user_reply_count(self, user_id: str) -> int:
         try:
-            result = self.client.table('user_stats').select('reply_count').eq('user_id', user_id).execute()
-            if result.data and len(result.data) > 0:
-                item = result.data[0]
-                if isinstance(item, dict):
-                    val = item.get('reply_count', 0)
-                    if isinstance(val, int):
-                        return val
-                    elif isinstance(val, str) and val.isdigit():
-                        return int(val)
-                return 0
-            return 0
+            result = self.client.table('user_stats').select('reply_count').eq('user_id', user_id).limit(1).execute()
         except Exception as e:
-            logger.debug(f"Database offline, allowing reply to user {user_id[:8]}: {e}")
+            logger.debug("Database offline, allowing reply to user %.8s: %s", user_id, e)
+            return 0
+        try:
+            return int(result.data[0]['reply_count']) if result.data else 0
+        except (KeyError, TypeError, ValueError):
             return 0
 
+    def get_user_reply_counts(self, user_ids: list[str]) -> Dict[str, int]:
+        """Return reply counts for several users in one query; missing users count as 0."""
+        if not user_ids:
+            return {}
+        try:
+            result = self.client.table('user_stats').select('user_id, reply_count').in_('user_id', user_ids).execute()
+            counts = {}
+            for item in result.data or []:
+                try:
+                    counts[item['user_id']] = int(item['reply_count'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+            return counts
+        except Exception as e:
+            # One name the filter syntax rejects fails the whole query, so count users one at a time instead
+            logger.debug("Bulk reply count lookup failed, querying %s users one by one: %s", len(user_ids), e)
+            return {user_id: self.get_user_reply_count(user_id) for user_id in user_ids}
+
     def get_last_reply_time(self, user_id: str) -> Optional[datetime]:
         try:
-            result = self.client.table('user_stats').select('last_reply_time').eq('user_id', user_id).execute()
-            if result.data and len(result.data) > 0:
-                item = result.data[0]
-                if isinstance(item, dict):
-                    last_reply = item.get('last_reply_time')
-                    if isinstance(last_reply, str):
-                        return datetime.fromisoformat(last_reply.replace('Z', '+00:00'))
-            return None
+            result = self.client.table('user_stats').select('last_reply_time').eq('user_id', user_id).limit(1).execute()
         except Exception as e:
-            logger.debug(f"Database offline, allowing reply to user {user_id[:8]}: {e}")
+            logger.debug("Database offline, allowing reply to user %.8s: %s", user_id, e)
             return None
+        try:
+            return datetime.fromisoformat(result.data[0]['last_reply_time'].replace('Z', '+00:00')) if result.data else None
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+
+    def update_user_stats(self, user_id: str, user_name: str, count: int = 1):
+        """Count `count` more replies to a user.
 
-    def update_user_stats(self, user_id: str, user_name: str):
+        Uses the bump_user_stats(p_user_id, p_user_name, p_count) SQL function from replit.md
+        when it is installed: a single INSERT ... ON CONFLICT (user_id) DO UPDATE that increments
+        reply_count atomically. Otherwise falls back to select-then-update.
+        """
+        if self._has_bump_rpc:
+            try:
+                self.client.rpc('bump_user_stats', {'p_user_id': user_id, 'p_user_name': user_name, 'p_count': count}).execute()
+                logger.debug("✓ Updated user stats for %s", user_name)
+                return
+            except APIError as e:
+                # PGRST202: function not installed; 42P10: user_stats.user_id has no unique constraint for ON CONFLICT
+                if e.code not in ('PGRST202', '42P10'):
+                    logger.debug("⚠️  Could not update user stats (offline mode): %s", e)
+                    return
+                logger.info("bump_user_stats unavailable (%s), updating user stats with select-then-update", e.code)
+                self._has_bump_rpc = False
+            except Exception as e:
+                logger.debug("⚠️  Could not update user stats (offline mode): %s", e)
+                return
         try:
             now = datetime.now().isoformat()
             existing = self.client.table('user_stats').select('user_id, reply_count').eq('user_id', user_id).execute()
@@ -91,7 +174,7 @@ class SupabaseDatabase:
                     current_count = item.get('reply_count', 0)
                     if isinstance(current_count, int):
                         self.client.table('user_stats').update({
-                            'reply_count': current_count + 1,
+                            'reply_count': current_count + count,
                             'last_reply_time': now,
                             'user_name': user_name
                         }).eq('user_id', user_id).execute()
@@ -99,28 +182,48 @@ class SupabaseDatabase:
                 self.client.table('user_stats').insert({
                     'user_id': user_id,
                     'user_name': user_name,
-                    'reply_count': 1,
+                    'reply_count': count,
                     'last_reply_time': now,
                     'first_reply_time': now
                 }).execute()
-            logger.debug(f"✓ Updated user stats for {user_name}")
+            logger.debug("✓ Updated user stats for %s", user_name)
         except Exception as e:
-            logger.debug(f"⚠️  Could not update user stats (offline mode): {e}")
+            logger.debug("⚠️  Could not update user stats (offline mode): %s", e)
 
     def add_rate_limit_entry(self):
+        with self._buffer_lock:
+            self._rate_limit_buffer.append({'timestamp': datetime.now().isoformat()})
+            full = len(self._rate_limit_buffer) >= 100
+            if not full and self._rate_limit_timer is None:
+                # The first buffered row schedules a flush, so no row waits longer than a second
+                self._rate_limit_timer = threading.Timer(1.0, self.flush_rate_limit_entries)
+                self._rate_limit_timer.daemon = True
+                self._rate_limit_timer.start()
+        if full:
+            self.flush_rate_limit_entries()
+
+    def flush_rate_limit_entries(self):
+        """Insert all buffered rate_limit_log rows in a single request."""
+        with self._buffer_lock:
+            rows, self._rate_limit_buffer = self._rate_limit_buffer, []
+            if self._rate_limit_timer is not None:
+                self._rate_limit_timer.cancel()
+                self._rate_limit_timer = None
+        if not rows:
+            return
         try:
-            data = {'timestamp': datetime.now().isoformat()}
-            self.client.table('rate_limit_log').insert(data).execute()
+            self.client.table('rate_limit_log').insert(rows).execute()
         except Exception as e:
-            logger.debug(f"⚠️  Could not log rate limit entry (offline mode): {e}")
+            logger.debug("⚠️  Could not log %s rate limit entries (offline mode): %s", len(rows), e)
 
     def get_recent_reply_count(self, window_seconds: int) -> int:
+        self.flush_rate_limit_entries()
         try:
             cutoff_time = (datetime.now() - timedelta(seconds=window_seconds)).isoformat()
-            result = self.client.table('rate_limit_log').select('id').gte('timestamp', cutoff_time).execute()
+            result = self.client.table('rate_limit_log').select('id', count='exact', head=True).gte('timestamp', cutoff_time).execute()
             return result.count if result.count is not None else 0
         except Exception as e:
-            logger.debug(f"Database offline, rate limiting disabled: {e}")
+            logger.debug("Database offline, rate limiting disabled: %s", e)
             return 0
 
     def log_event(self, event_type: str, event_data: str, level: str = 'info'):
@@ -135,33 +238,78 @@ class SupabaseDatabase:
         except Exception as e:
             logger.error(f"Error logging event: {e}")
 
+    def log_events_bulk(self, events: list[Dict[str, str]]):
+        """Insert several event_log rows in a single request."""
+        if not events:
+            return
+        try:
+            rows = [{**event, 'event_data': event['event_data'][:2000]} for event in events]
+            self.client.table('event_log').insert(rows).execute()
+        except Exception as e:
+            logger.error(f"Error logging {len(events)} events: {e}")
+
     def clean_old_rate_limit_entries(self, window_seconds: int):
+        self.flush_rate_limit_entries()
         try:
             cutoff_time = (datetime.now() - timedelta(seconds=window_seconds * 2)).isoformat()
             self.client.table('rate_limit_log').delete().lte('timestamp', cutoff_time).execute()
-            logger.debug(f"✓ Cleaned old rate limit entries before {cutoff_time}")
+            logger.debug("✓ Cleaned old rate limit entries before %s", cutoff_time)
         except Exception as e:
             logger.error(f"Error cleaning rate limit entries: {e}")
 
     def get_statistics(self) -> Dict[str, int]:
+        """Comment and user totals, from the get_bot_statistics function in one request when installed.
+
+        Otherwise falls back to four head-only count queries.
+        """
+        if self._has_stats_rpc:
+            try:
+                data = self.client.rpc('get_bot_statistics').execute().data
+                return {
+                    'total_comments': int(data['total_comments']),
+                    'unique_users': int(data['unique_users']),
+                    'successful': int(data['successful']),
+                    'failed': int(data['failed']),
+                    **self._cache_counts
+                }
+            except APIError as e:
+                if e.code != 'PGRST202':
+                    logger.error(f"Error getting statistics: {e}")
+                    return {'total_comments': 0, 'unique_users': 0, 'successful': 0, 'failed': 0, **self._cache_counts}
+                logger.info("get_bot_statistics unavailable (%s), counting statistics with separate queries", e.code)
+                self._has_stats_rpc = False
+            except Exception as e:
+                logger.error(f"Error getting statistics: {e}")
+                return {'total_comments': 0, 'unique_users': 0, 'successful': 0, 'failed': 0, **self._cache_counts}
         try:
-            total_result = self.client.table('processed_comments').select('id').execute()
+            # Head-only exact counts: PostgREST returns just the Content-Range total, no rows
+            total_result = self.client.table('processed_comments').select('id', count='exact', head=True).execute()
             total_comments = total_result.count if total_result.count is not None else 0
-            unique_result = self.client.table('user_stats').select('user_id').execute()
+            unique_result = self.client.table('user_stats').select('user_id', count='exact', head=True).execute()
             unique_users = unique_result.count if unique_result.count is not None else 0
-            success_result = self.client.table('processed_comments').select('id').eq('status', 'success').execute()
+            success_result = self.client.table('processed_comments').select('id', count='exact', head=True).eq('status', 'success').execute()
             successful = success_result.count if success_result.count is not None else 0
-            failed_result = self.client.table('processed_comments').select('id').eq('status', 'failed').execute()
+            failed_result = self.client.table('processed_comments').select('id', count='exact', head=True).eq('status', 'failed').execute()
             failed = failed_result.count if failed_result.count is not None else 0
             return {
                 'total_comments': total_comments,
                 'unique_users': unique_users,
                 'successful': successful,
-                'failed': failed
+                'failed': failed,
+                **self._cache_counts
             }
         except Exception as e:
             logger.error(f"Error getting statistics: {e}")
-            return {'total_comments': 0, 'unique_users': 0, 'successful': 0, 'failed': 0}
+            return {'total_comments': 0, 'unique_users': 0, 'successful': 0, 'failed': 0, **self._cache_counts}
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Hits, misses and hit rate for the processed and replied comment ID caches."""
+        stats = {}
+        for name in ('processed', 'replied'):
+            hits = self._cache_counts[f'{name}_hits']
+            misses = self._cache_counts[f'{name}_misses']
+            stats[name] = {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+        return stats
 
     def get_processed_comment(self, comment_id: str) -> Optional[Dict]:
         """Get details about a processed comment including the reply that was sent."""
@@ -171,7 +319,7 @@ class SupabaseDatabase:
                 return result.data[0]
             return None
         except Exception as e:
-            logger.debug(f"Error getting processed comment {comment_id[:8]}: {e}")
+            logger.debug("Error getting processed comment %.8s: %s", comment_id, e)
             return None
 
     def get_reply_for_comment(self, comment_id: str) -> Optional[str]:
@@ -182,19 +330,30 @@ class SupabaseDatabase:
                 return result.data[0].get('response_text')
             return None
         except Exception as e:
-            logger.debug(f"Error getting reply for comment {comment_id[:8]}: {e}")
+            logger.debug("Error getting reply for comment %.8s: %s", comment_id, e)
             return None
 
     def get_all_replied_comment_ids(self, limit: int = 1000) -> list[str]:
         """Get a list of all comment IDs that have been replied to."""
-        try:
-            result = self.client.table('processed_comments').select('comment_id').eq('status', 'success').order('timestamp', desc=True).limit(limit).execute()
-            if result.data:
-                return [item.get('comment_id') for item in result.data if item.get('comment_id')]
-            return []
-        except Exception as e:
-            logger.debug(f"Error getting replied comment IDs: {e}")
-            return []
+        return list(self.iter_replied_comment_ids(limit=limit))
+
+    def iter_replied_comment_ids(self, page_size: int = 1000, limit: Optional[int] = None) -> Iterator[str]:
+        """Yield replied comment IDs newest first, fetching page_size rows per request."""
+        start = 0
+        while limit is None or start < limit:
+            end = start + page_size if limit is None else min(start + page_size, limit)
+            try:
+                result = self.client.table('processed_comments').select('comment_id').eq('status', 'success').order('timestamp', desc=True).range(start, end - 1).execute()
+            except Exception as e:
+                logger.debug("Error getting replied comment IDs: %s", e)
+                return
+            rows = result.data or []
+            for item in rows:
+                if item.get('comment_id'):
+                    yield item['comment_id']
+            if len(rows) < end - start:
+                return
+            start = end
 
     def get_recent_replies(self, hours: int = 24, limit: int = 100) -> list[Dict]:
         """Get recent replies within the specified hours."""
@@ -205,7 +364,7 @@ class SupabaseDatabase:
                 return result.data
             return []
         except Exception as e:
-            logger.debug(f"Error getting recent replies: {e}")
+            logger.debug("Error getting recent replies: %s", e)
             return []
 
     def get_replies_by_user(self, user_id: str) -> list[Dict]:
@@ -216,17 +375,44 @@ class SupabaseDatabase:
                 return result.data
             return []
         except Exception as e:
-            logger.debug(f"Error getting replies for user {user_id[:8]}: {e}")
+            logger.debug("Error getting replies for user %.8s: %s", user_id, e)
             return []
 
     def has_replied_to_comment(self, comment_id: str) -> bool:
         """Check if we have successfully replied to a comment (status = 'success')."""
+        if comment_id in self._replied_ids:
+            self._count('replied_hits')
+            return True
+        self._count('replied_misses')
         try:
             result = self.client.table('processed_comments').select('id').eq('comment_id', comment_id).eq('status', 'success').limit(1).execute()
-            return len(result.data) > 0 if result.data else False
+            if result.data:
+                self._remember(comment_id, 'success')
+                return True
+            return False
         except Exception as e:
-            logger.debug(f"Error checking if replied to comment {comment_id[:8]}: {e}")
+            logger.debug("Error checking if replied to comment %.8s: %s", comment_id, e)
             return False
 
+    def get_replied_comment_ids(self, comment_ids: list[str]) -> set[str]:
+        """Return the subset of comment_ids we have successfully replied to, in one query."""
+        known = {comment_id for comment_id in comment_ids if comment_id in self._replied_ids}
+        unknown = [comment_id for comment_id in comment_ids if comment_id not in known]
+        self._count('replied_hits', len(known))
+        self._count('replied_misses', len(unknown))
+        if not unknown:
+            return known
+        try:
+            result = self.client.table('processed_comments').select('comment_id').in_('comment_id', unknown).eq('status', 'success').execute()
+            for item in result.data or []:
+                if item.get('comment_id'):
+                    self._remember(item['comment_id'], 'success')
+                    known.add(item['comment_id'])
+            return known
+        except Exception as e:
+            logger.debug("Error checking replied comments in bulk: %s", e)
+            return known
+
     def close(self):
+        self.flush_rate_limit_entries()
         logger.info("Supabase connection closed (REST client)")
@@ -3,11 +3,15 @@ Utility modules for the Facebook AI Reply Bot.
 """
 from .logger import setup_logger
 from .retry import retry_with_backoff
+from .rate_limiter import TokenBucket
+from .cache import LRUCache
 from .validators import validate_comment_id, validate_user_id, sanitize_text, validate_url
 
 __all__ = [
     'setup_logger',
     'retry_with_backoff',
+    'TokenBucket',
+    'LRUCache',
     'validate_comment_id',
     'validate_user_id',
     'sanitize_text',
@@ -0,0 +1,40 @@
+"""
+Bounded in-memory caches.
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(OrderedDict):
+    """
+    OrderedDict that evicts its least recently used entry once it grows past maxsize.
+
+    Reads through [] and writes both mark a key as recently used; membership
+    tests with `in` do not. Reads and writes hold a lock, so one cache can be
+    shared by worker threads.
+
+    Args:
+        maxsize: Maximum number of entries kept
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            if len(self) > self.maxsize:
+                del self[next(iter(self))]
+
+    def __contains__(self, key):
+        with self._lock:
+            return super().__contains__(key)
@@ -3,7 +3,7 @@ Centralized logging configuration.
 """
 import os
 import logging
-from datetime import datetime
+from logging.handlers import RotatingFileHandler
 from typing import Optional
 
 
@@ -23,13 +23,6 @@ def setup_logger(
     Returns:
         Configured logger instance
     """
-    os.makedirs(log_dir, exist_ok=True)
-
-    log_filename = os.path.join(
-        log_dir,
-        f"facebook_reply_bot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    )
-
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
@@ -37,8 +30,11 @@ def setup_logger(
     if logger.handlers:
         return logger
 
-    # File handler
-    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+    os.makedirs(log_dir, exist_ok=True)
+    log_filename = os.path.join(log_dir, 'facebook_reply_bot.log')
+
+    # File handler: one stable file, rotated at 10 MB with 5 backups kept
+    file_handler = RotatingFileHandler(log_filename, maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf-8')
     file_handler.setLevel(level)
     file_formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -0,0 +1,61 @@
+"""
+Token bucket rate limiting for outbound API calls.
+"""
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket shared by all coroutines calling the same API.
+
+    Tokens refill continuously at rate_per_minute / 60 per second. After a
+    rate-limit response, penalize() cuts the refill rate for a while
+    (multiplicative decrease) and it recovers on its own once the
+    penalty expires.
+
+    Args:
+        rate_per_minute: Sustained number of tokens allowed per minute
+        capacity: Maximum burst size (defaults to one minute's worth)
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else float(rate_per_minute)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._penalty_factor = 1.0
+        self._penalty_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _current_rate(self) -> float:
+        if time.monotonic() < self._penalty_until:
+            return self.rate * self._penalty_factor
+        return self.rate
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self._current_rate())
+        self._last_refill = now
+
+    async def take(self, n: float = 1.0) -> None:
+        """Wait until n tokens are available, then consume them."""
+        n = min(n, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                await asyncio.sleep((n - self._tokens) / self._current_rate())
+
+    def penalize(self, factor: float = 0.5, duration: float = 30.0) -> None:
+        """Drain the bucket and scale the refill rate by factor for duration seconds."""
+        self._refill()
+        self._tokens = 0.0
+        self._penalty_factor = factor
+        self._penalty_until = time.monotonic() + duration
+        logger.warning(f"Rate limited, slowing to {factor:.0%} of normal rate for {duration:.0f}s")
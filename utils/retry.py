@@ -2,7 +2,11 @@
 Retry decorator and utilities for robust error handling.
 """
 import time
+import random
+import asyncio
+import inspect
 import logging
+import threading
 from functools import wraps
 from typing import Callable, TypeVar, ParamSpec, Any
 
@@ -12,25 +16,90 @@ P = ParamSpec('P')
 T = TypeVar('T')
 
 
+async def _wait_async(stop_event: threading.Event, timeout: float) -> bool:
+    """
+    Sleep up to timeout seconds without blocking the event loop, ending
+    within 50 ms once stop_event is set. Returns True if it was set.
+
+    A threading.Event can't be awaited directly; polling avoids parking an
+    executor thread that asyncio.run would have to join on shutdown.
+    """
+    deadline = time.monotonic() + timeout
+    while not stop_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(remaining, 0.05))
+    return True
+
+
 def retry_with_backoff(
     max_retries: int = 3,
     initial_delay: float = 1.0,
     backoff_factor: float = 2.0,
-    exceptions: tuple[type[Exception], ...] = (Exception,)
+    exceptions: tuple[type[Exception], ...] = (Exception,),
+    max_delay: float = 30.0,
+    stop_event: threading.Event | None = None
 ) -> Callable[[Callable[P, T]], Callable[P, T]]:
     """
-    Retry decorator with exponential backoff.
+    Retry decorator with jittered exponential backoff.
+
+    Works on both plain functions and coroutine functions; coroutines are
+    retried with asyncio.sleep so the event loop is not blocked. Each wait
+    is the current delay scaled by a random factor in [0.5, 1.5), so
+    callers that failed together do not retry in lockstep.
 
     Args:
         max_retries: Maximum number of retry attempts
         initial_delay: Initial delay in seconds
         backoff_factor: Multiplier for delay after each retry
         exceptions: Tuple of exceptions to catch and retry on
+        max_delay: Upper bound in seconds for any single wait
+        stop_event: When set (e.g. on shutdown), pending waits end early on both
+            the sync and async paths and the last failure is raised instead of retrying
 
     Returns:
         Decorated function with retry logic
     """
     def decorator(func: Callable[P, T]) -> Callable[P, T]:
+        def next_delay(attempt: int, delay: float, e: Exception) -> float | None:
+            """Log the failure and return how long to wait, or None when out of attempts."""
+            if attempt >= max_retries - 1:
+                logger.error(f"{func.__name__} failed after {max_retries} attempts: {e}")
+                return None
+            wait = min(delay * (0.5 + random.random()), max_delay)
+            logger.warning(
+                f"{func.__name__} failed (attempt {attempt + 1}/{max_retries}): {e}. "
+                f"Retrying in {wait:.2f}s..."
+            )
+            return wait
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+                delay = initial_delay
+                last_exception: Exception | None = None
+
+                for attempt in range(max_retries):
+                    try:
+                        return await func(*args, **kwargs)
+                    except exceptions as e:
+                        last_exception = e
+                        wait = next_delay(attempt, delay, e)
+                        if wait is not None:
+                            if stop_event:
+                                if await _wait_async(stop_event, wait):
+                                    raise
+                            else:
+                                await asyncio.sleep(wait)
+                            delay = min(delay * backoff_factor, max_delay)
+
+                if last_exception:
+                    raise last_exception
+                raise RuntimeError(f"{func.__name__} failed after {max_retries} attempts")
+
+            return async_wrapper  # type: ignore[return-value]
+
         @wraps(func)
         def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
             delay = initial_delay
@@ -41,15 +110,14 @@ def retry_with_backoff(
                     return func(*args, **kwargs)
                 except exceptions as e:
                     last_exception = e
-                    if attempt < max_retries - 1:
-                        logger.warning(
-                            f"{func.__name__} failed (attempt {attempt + 1}/{max_retries}): {e}. "
-                            f"Retrying in {delay:.2f}s..."
-                        )
-                        time.sleep(delay)
-                        delay *= backoff_factor
-                    else:
-                        logger.error(f"{func.__name__} failed after {max_retries} attempts: {e}")
+                    wait = next_delay(attempt, delay, e)
+                    if wait is not None:
+                        if stop_event:
+                            if stop_event.wait(wait):
+                                raise
+                        else:
+                            time.sleep(wait)
+                        delay = min(delay * backoff_factor, max_delay)
 
             if last_exception:
                 raise last_exception
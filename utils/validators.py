@@ -3,6 +3,14 @@ Input validation utilities.
 """
 import re
 from typing import Optional
+from urllib.parse import urlsplit
+
+_ID_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
+# Control characters except tab, newline and carriage return, mapped to None for str.translate
+_CTRL_TABLE = dict.fromkeys([*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), 0x7F])
+# Hostname checks for validate_url; urlsplit has already lowercased the host
+_HOST_RE = re.compile(r'(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,6}\.?\Z')
+_IPV4_RE = re.compile(r'\d{1,3}(?:\.\d{1,3}){3}\Z')
 
 
 def validate_comment_id(comment_id: str) -> bool:
@@ -10,14 +18,14 @@ def validate_comment_id(comment_id: str) -> bool:
     if not comment_id or len(comment_id) < 8:
         return False
     # Comment IDs are typically alphanumeric hashes
-    return bool(re.match(r'^[a-zA-Z0-9_-]+$', comment_id))
+    return bool(_ID_RE.match(comment_id))
 
 
 def validate_user_id(user_id: str) -> bool:
     """Validate user ID format."""
     if not user_id or len(user_id) < 8:
         return False
-    return bool(re.match(r'^[a-zA-Z0-9_-]+$', user_id))
+    return bool(_ID_RE.match(user_id))
 
 
 def sanitize_text(text: Optional[str], max_length: int = 1000) -> str:
@@ -26,7 +34,7 @@ def sanitize_text(text: Optional[str], max_length: int = 1000) -> str:
         return ""
 
     # Remove control characters except newlines and tabs
-    sanitized = re.sub(r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]', '', text)
+    sanitized = text.translate(_CTRL_TABLE)
 
     # Truncate if needed
     if len(sanitized) > max_length:
@@ -37,16 +45,21 @@ def sanitize_text(text: Optional[str], max_length: int = 1000) -> str:
 
 def validate_url(url: Optional[str]) -> bool:
     """Validate URL format."""
-    if not url:
+    if not url or any(c.isspace() for c in url):
+        return False
+
+    try:
+        parts = urlsplit(url)
+        parts.port  # Raises ValueError for a malformed port
+    except ValueError:
         return False
 
-    url_pattern = re.compile(
-        r'^https?://'  # http:// or https://
-        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
-        r'localhost|'  # localhost...
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
-        r'(?::\d+)?'  # optional port
-        r'(?:/?|[/?]\S+)$', re.IGNORECASE
+    host = parts.hostname or ''
+    return (
+        parts.scheme in ('http', 'https')
+        and '@' not in parts.netloc
+        and not parts.netloc.endswith(':')  # An empty port parses as no port
+        and not url.endswith(parts.netloc + '?')  # Nor does a bare "?" after the host
+        and (host == 'localhost' or bool(_HOST_RE.match(host)) or bool(_IPV4_RE.match(host)))
     )
-    return bool(url_pattern.match(url))
 